@@ -1,9 +1,14 @@
-import pandas as pd
+from pathlib import Path
 from typing import Dict, Tuple
 
-# ---------- Config / CSV loader (above classes) ----------
+import numpy as np
+import pandas as pd
+
+from toolbox import load_ranges, _oor_mask_2d, _ranges_as_arrays
 
-DEFAULT_RANGES_CSV = "./data/ranges/water_quality_ranges.csv"
+# ---------- Config / ranges loader (above classes) ----------
+
+DEFAULT_RANGES_PATH = "./data/ranges/water_quality_ranges.xlsx"
 
 # Fixed schema (assumed columns in your data)
 PARAM_COLS = [
@@ -17,6 +22,15 @@ PARAM_COLS = [
     "Fine Oil (ppm)",
 ]
 
+# Cell values treated as "no data" (on top of real NaN)
+NA_TOKENS = ("N/A", "NA", "na", "n/a", "-", "—", "")
+_NA_SET = frozenset(t.strip() for t in NA_TOKENS)
+
+# Interned style strings, reused across all cells
+_RED = "background-color: #532fd3; color: white;"
+_YELLOW = "background-color: #fff3b0;"
+_EMPTY = ""
+
 # Optional fallback (used if CSV missing/unreadable)
 _FALLBACK_RANGES: Dict[str, Tuple[float, float]] = {
     "Water Temperature (°C)": (26.00, 35.00),
@@ -29,44 +43,46 @@ _FALLBACK_RANGES: Dict[str, Tuple[float, float]] = {
     "Fine Oil (ppm)": (0.00, 0.500),
 }
 
-def load_ranges_csv_simple(path: str = DEFAULT_RANGES_CSV) -> Dict[str, Tuple[float, float]]:
+def _load_tracked_ranges(path: str = DEFAULT_RANGES_PATH) -> Dict[str, Tuple[float, float]]:
     """
-    Reads ranges from a CSV with schema:
-        parameter,min,max
-        Water Temperature (°C),0,35
-        ...
-    Returns: { parameter_name: (min_val, max_val) }
+    Load the tracked-parameter ranges through the shared (mtime-cached)
+    toolbox loader. Returns: { parameter_name: (min_val, max_val) }.
     """
     try:
-        df = pd.read_csv(path)
-        required = {"parameter", "min", "max"}
-        if not required.issubset(df.columns):
-            raise ValueError(f"ranges CSV must have columns: {sorted(required)}")
-
-        ranges: Dict[str, Tuple[float, float]] = {}
-        for _, row in df.iterrows():
-            p = str(row["parameter"]).strip()
-            if p in PARAM_COLS:
-                ranges[p] = (float(row["min"]), float(row["max"]))
-
-        # Ensure we have all fixed params; otherwise fail back to defaults
-        missing = [p for p in PARAM_COLS if p not in ranges]
-        if missing:
-            # Fall back to defaults for any missing, but keep CSV-provided ones
-            for p in missing:
-                ranges[p] = _FALLBACK_RANGES[p]
-        return ranges
+        loaded = load_ranges(Path(path))
+        ranges = {p: loaded[p] for p in PARAM_COLS if p in loaded}
+        # Defaults fill in any missing fixed params; file-provided ones win
+        return {**_FALLBACK_RANGES, **ranges}
 
     except Exception:
         # If file missing or malformed, fall back to hardcoded defaults
         return dict(_FALLBACK_RANGES)
 
 
+def _na_mask(col: pd.Series, na_tokens=NA_TOKENS) -> np.ndarray:
+    """
+    Bool array marking NaN cells or cells equal to one of na_tokens.
+    Tokens are only checked on string-holding (object) columns, via a
+    frozenset lookup on the raw array — no astype(str)/str.strip()
+    intermediate Series are allocated.
+    """
+    arr = col.to_numpy()
+    na = pd.isna(arr)
+    if arr.dtype == object:
+        na_set = _NA_SET if na_tokens is NA_TOKENS else frozenset(t.strip() for t in na_tokens)
+        na |= np.fromiter(
+            (isinstance(x, str) and x.strip() in na_set for x in arr),
+            dtype=bool,
+            count=len(arr),
+        )
+    return na
+
+
 # ---------- Classes ----------
 
 class WQ_Buoy:
-    # Load from CSV at class definition time (calls the loader defined above)
-    RANGES: Dict[str, Tuple[float, float]] = load_ranges_csv_simple()
+    # Load at class definition time (calls the loader defined above)
+    RANGES: Dict[str, Tuple[float, float]] = _load_tracked_ranges()
 
     def __init__(
         self,
@@ -91,38 +107,49 @@ class WQ_Buoy:
         self.fineOil = fineOil
 
     @classmethod
-    def refresh_ranges_from_csv(cls, path: str = DEFAULT_RANGES_CSV) -> None:
+    def refresh_ranges_from_csv(cls, path: str = DEFAULT_RANGES_PATH) -> None:
         """Optional helper to reload ranges at runtime."""
-        cls.RANGES = load_ranges_csv_simple(path)
+        cls.RANGES = _load_tracked_ranges(path)
+
+    @classmethod
+    def frame_masks(cls, df: pd.DataFrame, na_tokens=NA_TOKENS):
+        """
+        Return (na_2d, oor_2d) boolean arrays of df.shape for the whole frame.
+        The out-of-range mask is one 2D broadcast against the (lo, hi) vectors
+        from _ranges_as_arrays instead of a per-column dict lookup + compare.
+        """
+        n_rows, n_cols = df.shape
+        if not n_cols:
+            empty = np.zeros((n_rows, 0), dtype=bool)
+            return empty, empty
+
+        na_2d = np.column_stack([_na_mask(df[c], na_tokens) for c in df.columns])
+
+        lo, hi, is_tracked = _ranges_as_arrays(df.columns, cls.RANGES)
+        oor_2d = np.zeros((n_rows, n_cols), dtype=bool)
+        if is_tracked.any():
+            # NaN compares False on both sides, so this is already NaN-safe
+            vals = df.loc[:, is_tracked].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+            oor_2d[:, is_tracked] = _oor_mask_2d(vals, lo[is_tracked], hi[is_tracked])
+        return na_2d, oor_2d
 
     @classmethod
     def highlight_out_of_range(
         cls,
         df: pd.DataFrame,
-        na_tokens=("N/A", "NA", "na", "n/a", "-", "—", ""),  # add/remove tokens as you like
+        na_tokens=NA_TOKENS,  # add/remove tokens as you like
     ):
         """
         - Yellow: cells that are NA-like (NaN or one of na_tokens)
         - Red: cells outside the configured range (overrides yellow when applicable)
         """
-        def style_col(col: pd.Series):
-            # 1) Base styles: NA-like -> yellow
-            col_str = col.astype(str).str.strip()
-            na_mask = col.isna() | col_str.isin(na_tokens)
-            styles = ["background-color: #fff3b0;" if is_na else "" for is_na in na_mask]
-
-            # 2) Overlay OOR: only for parameter columns we track
-            rng = cls.RANGES.get(col.name)
-            if rng:
-                lo, hi = rng
-                vals = pd.to_numeric(col, errors="coerce")
-                oor_mask = (vals < lo) | (vals > hi)
-                for i, is_oor in enumerate(oor_mask.fillna(False)):
-                    if is_oor:
-                        styles[i] = "background-color: #532fd3; color: white;"
-            return styles
-
-        return df.style.apply(style_col, axis=0)
+        def style_frame(frame: pd.DataFrame) -> pd.DataFrame:
+            na_2d, oor_2d = cls.frame_masks(frame, na_tokens)
+            css = np.where(oor_2d, _RED, np.where(na_2d, _YELLOW, _EMPTY))
+            return pd.DataFrame(css, index=frame.index, columns=frame.columns)
+
+        # axis=None: one call over the whole frame instead of one per column
+        return df.style.apply(style_frame, axis=None)
 
 
 class Weather_Buoy:
@@ -1,15 +1,24 @@
 # main.py
+import hashlib
 import io
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, List, Optional
 
-import pandas as pd  
+import anyio.to_thread
+
+import numpy as np
+import pandas as pd
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill
 
 from fastapi import FastAPI, UploadFile, Form, File, Request
 from fastapi.responses import JSONResponse, HTMLResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from wq_buoy import _read_dataframe_from_bytes
+from wq_buoy import _iter_dataframe_chunks_from_upload
 from buoys import WQ_Buoy
 
 # ----------------------------
@@ -17,15 +26,24 @@ from buoys import WQ_Buoy
 # ----------------------------
 LATEST_DOWNLOAD_BYTES: Optional[bytes] = None
 
+# Highlight fills, same colours as the Styler path. One object per colour,
+# reused for every cell: openpyxl dedupes style records only when the same
+# Python object is attached, otherwise each fill emits its own xf record
+# and inflates the xlsx.
+YELLOW_FILL = PatternFill("solid", fgColor="FFF3B0")
+RED_FILL = PatternFill("solid", fgColor="532FD3")
+
+# Memoized workbooks keyed on sha1 of (filenames + upload contents), so
+# re-uploading the same files skips the parse/style/serialize pipeline
+WORKBOOK_CACHE: "OrderedDict[bytes, bytes]" = OrderedDict()
+WORKBOOK_CACHE_MAX = 4
+
 # ----------------------------
 # Config
 # ----------------------------
 DATA_DIR = Path("./data")
 RANGES_CSV = Path("./data/ranges/water_quality_ranges.xlsx")  # kept if you want to refresh later
 
-for p in (DATA_DIR, RANGES_CSV.parent):
-    p.mkdir(parents=True, exist_ok=True)
-
 app = FastAPI(title="Upload Grid Backend", version="1.2.0")
 
 # ----------------------------
@@ -53,29 +71,79 @@ async def serve_frontend():
 # ----------------------------
 # Helpers
 # ----------------------------
-def _highlight_df_bytes(dfs: List[Dict[str, object]]) -> bytes:
+def _write_highlighted_workbook(sheets: List[Dict[str, object]]) -> io.BytesIO:
     """
-    Accepts a list of { 'name': <sheet_name>, 'df': <pandas DataFrame> }.
-    Applies WQ_Buoy.highlight_out_of_range to each and writes a single
-    Excel workbook (one sheet per df) into bytes.
+    Write one sheet per entry into a write-only openpyxl workbook, colouring
+    cells from the boolean NA/OOR masks of WQ_Buoy.frame_masks. Each entry
+    holds either a whole DataFrame ('df') or an iterable of DataFrame chunks
+    ('chunks'); chunks are pipelined straight into the sheet so peak memory
+    stays bounded by the chunk size. Avoids the Styler -> ExcelFormatter
+    path, which walks every cell in Python.
     """
+    wb = Workbook(write_only=True)
+    for entry in sheets:
+        name: str = entry["name"]  # sheet name
+        chunks = entry.get("chunks")
+        if chunks is None:
+            chunks = [entry["df"]]
+        ws = wb.create_sheet(title=name)
+
+        header_written = False
+        for chunk in chunks:
+            if not header_written:
+                # Header row: blank cell over the index, then the column names
+                ws.append([None] + [str(c) for c in chunk.columns])
+                header_written = True
+
+            na_2d, oor_2d = WQ_Buoy.frame_masks(chunk)
+
+            # Substitute the NA sentinel on the write-side copy only; the
+            # chunk itself stays numeric (no fillna materialization, no
+            # object-dtype cast of the source frame)
+            # copy=True: to_numpy may hand back a read-only view of the block
+            values = chunk.to_numpy(dtype=object, copy=True)
+            values[pd.isna(values)] = "N/A"
+            index = chunk.index.to_numpy(dtype=object)
+            for r in range(len(chunk)):
+                row = [WriteOnlyCell(ws, value=index[r])]
+                for c in range(values.shape[1]):
+                    cell = WriteOnlyCell(ws, value=values[r, c])
+                    if oor_2d[r, c]:
+                        cell.fill = RED_FILL
+                    elif na_2d[r, c]:
+                        cell.fill = YELLOW_FILL
+                    row.append(cell)
+                ws.append(row)
+
     buf = io.BytesIO()
-    # One writer for the whole workbook
-    with pd.ExcelWriter(buf, engine="openpyxl") as writer:
-        for entry in dfs:
-            name: str = entry["name"]  # sheet name
-            df = entry["df"]
-            df_display = df.fillna("N/A")
-            styler = WQ_Buoy.highlight_out_of_range(df_display)
-            # Write each styled sheet; pass the open writer
-            try:
-                styler.to_excel(writer, sheet_name=name, na_rep="N/A")
-            except TypeError:
-                # older pandas Styler without na_rep support
-                styler.data = styler.data.fillna("N/A")
-                styler.to_excel(writer, sheet_name=name)
-    buf.seek(0)
-    return buf.getvalue()
+    wb.save(buf)
+    return buf
+
+
+def _highlight_df_bytes(dfs: List[Dict[str, object]]) -> io.BytesIO:
+    """
+    Accepts a list of { 'name': <sheet_name>, 'df': <pandas DataFrame> }.
+    Applies the WQ_Buoy highlighting rules to each and writes a single
+    Excel workbook (one sheet per df) into a BytesIO. Returning the buffer
+    (rather than .getvalue()) leaves the single bytes copy to the caller.
+    """
+    return _write_highlighted_workbook(dfs)
+
+def _upload_cache_key(uploads: List[UploadFile]) -> bytes:
+    """
+    sha1 over each upload's filename and content (read in 1 MiB blocks from
+    the spooled temp file). Identical re-uploads map to the same key.
+    """
+    h = hashlib.sha1()
+    for f in uploads:
+        h.update((f.filename or "").encode("utf-8", "surrogateescape"))
+        h.update(b"\0")
+        f.file.seek(0)
+        for block in iter(lambda: f.file.read(1 << 20), b""):
+            h.update(block)
+        h.update(b"\0")
+    return h.digest()
+
 
 def _unique_sheet_name(base: str, existing: set) -> str:
     """
@@ -123,22 +191,38 @@ async def upload_and_highlight(
         existing_names: set = set()
 
         for idx, f in enumerate(incoming, start=1):
-            content_bytes = await f.read()
-            df = _read_dataframe_from_bytes(content_bytes, f.filename or f"uploaded_{idx}.csv")
-
             # Sheet name: prefer the filename stem; ensure uniqueness and <=31 chars
             base = (f.filename or f"Sheet{idx}").rsplit(".", 1)[0].strip() or f"Sheet{idx}"
             sheet_name = _unique_sheet_name(base, existing_names)
             existing_names.add(sheet_name)
 
-            sheets.append({"name": sheet_name, "df": df})
+            # Parse lazily in chunks straight from the spooled temp file; the
+            # workbook writer consumes them so only one chunk is resident
+            sheets.append({"name": sheet_name, "chunks": _iter_dataframe_chunks_from_upload(f)})
 
-        # Build a single workbook in memory
-        excel_bytes = _highlight_df_bytes(sheets)
-
-        # Save as the latest in-memory workbook (tokenless, reusable)
         global LATEST_DOWNLOAD_BYTES
-        LATEST_DOWNLOAD_BYTES = excel_bytes
+
+        # Hashing reads every spooled file back in full — keep that off the
+        # event loop as well, so other requests' uploads keep streaming in
+        # while this one is fingerprinted
+        cache_key = await anyio.to_thread.run_sync(_upload_cache_key, incoming)
+        cached = WORKBOOK_CACHE.get(cache_key)
+        if cached is not None:
+            # Same files as a recent upload: reuse the built workbook
+            WORKBOOK_CACHE.move_to_end(cache_key)
+            LATEST_DOWNLOAD_BYTES = cached
+        else:
+            # Build a single workbook in memory, off the event loop: parsing +
+            # styling + serialization is CPU-bound and would otherwise block
+            # every other request for its full duration
+            buf = await anyio.to_thread.run_sync(_highlight_df_bytes, sheets)
+
+            # Save as the latest in-memory workbook (tokenless, reusable);
+            # the only bytes copy of the buffer happens here
+            LATEST_DOWNLOAD_BYTES = buf.getvalue()
+            WORKBOOK_CACHE[cache_key] = LATEST_DOWNLOAD_BYTES
+            while len(WORKBOOK_CACHE) > WORKBOOK_CACHE_MAX:
+                WORKBOOK_CACHE.popitem(last=False)
 
         base_url = str(request.base_url).rstrip("/")
         download_url = f"{base_url}/api/download/latest"
@@ -184,11 +268,3 @@ def download_latest():
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers=headers,
     )
-
-
-@app.get("/", response_class=HTMLResponse)
-async def serve_frontend():
-    index_path = Path("index.html")
-    if index_path.exists():
-        return index_path.read_text(encoding="utf-8")
-    return "<h1>index.html not found</h1>"
@@ -1,23 +1,35 @@
 # toolbox.py
 from __future__ import annotations
+import functools
 from pathlib import Path
 from typing import Dict, Tuple
+import numpy as np
 import pandas as pd
 
+try:
+    # Optional: fuses the out-of-range compares for very large sheets.
+    # Everything works without it via the numpy fallback below.
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
 # Expected header names in ranges CSV (case-insensitive):
 # Parameter, Min, Max
 REQUIRED_HEADERS = ("parameter", "min", "max")
 
+# Interned style strings: reused for every cell instead of building a new
+# string per out-of-range hit
+_RED = "background-color: #d92d20; color: white;"
+_EMPTY = ""
 
-def load_ranges(csv_path: Path) -> Dict[str, Tuple[float, float]]:
+
+@functools.lru_cache(maxsize=8)
+def _load_ranges_cached(path_str: str, mtime: float) -> Dict[str, Tuple[float, float]]:
     """
-    Load dynamic ranges from an XLSX file with columns: Parameter, Min, Max (case-insensitive).
-    Returns a dict like { "Water Temperature (°C)": (26.0, 35.0), ... }.
+    Do the actual XLSX parse + normalization. Cached on (path, mtime) so the
+    file is only re-parsed when it changes on disk, not on every upload.
     """
-    if not csv_path.exists():
-        raise FileNotFoundError(f"Ranges file not found: {csv_path}")
-
-    df = pd.read_excel(csv_path)  # Changed from read_csv to read_excel
+    df = pd.read_excel(path_str)  # Changed from read_csv to read_excel
 
     # normalize headers
     lower_map = {c.lower(): c for c in df.columns}
@@ -36,61 +48,90 @@ def load_ranges(csv_path: Path) -> Dict[str, Tuple[float, float]]:
     df[maxcol] = pd.to_numeric(df[maxcol], errors="coerce")
     df = df.dropna(subset=[mincol, maxcol])
 
-    ranges: Dict[str, Tuple[float, float]] = {}
-    for _, row in df.iterrows():
-        param = str(row[pcol]).strip()
-        ranges[param] = (float(row[mincol]), float(row[maxcol]))
-    return ranges
+    # Build the dict from plain numpy arrays instead of iterrows, which
+    # boxes every row into a Series.
+    params = df[pcol].astype(str).str.strip().to_numpy()
+    mins = df[mincol].to_numpy(dtype=float)
+    maxs = df[maxcol].to_numpy(dtype=float)
+    return dict(zip(params, map(tuple, np.stack([mins, maxs], axis=1))))
 
 
-def highlight_out_of_range(df: pd.DataFrame, ranges: Dict[str, Tuple[float, float]]) -> pd.io.formats.style.Styler:
-    """
-    Returns a Styler with cells outside [min, max] highlighted in red.
-    Only columns present in 'ranges' are evaluated; others are untouched.
-    """
-    def style_column(col: pd.Series):
-        name = col.name
-        if name not in ranges:
-            return [""] * len(col)
-        min_v, max_v = ranges[name]
-        # Ensure numeric comparison
-        numeric = pd.to_numeric(col, errors="coerce")
-        mask = (numeric < min_v) | (numeric > max_v)
-        return ["background-color: #d92d20; color: white;" if out else "" for out in mask]
-
-    return df.style.apply(style_column, axis=0)
-
-
-def load_maintenance(csv_path: Path) -> Dict[str, Tuple[float, float]]:
+def load_ranges(csv_path: Path) -> Dict[str, Tuple[float, float]]:
     """
     Load dynamic ranges from an XLSX file with columns: Parameter, Min, Max (case-insensitive).
     Returns a dict like { "Water Temperature (°C)": (26.0, 35.0), ... }.
     """
     if not csv_path.exists():
         raise FileNotFoundError(f"Ranges file not found: {csv_path}")
+    return _load_ranges_cached(str(csv_path), csv_path.stat().st_mtime)
 
-    df = pd.read_excel(csv_path)  # Changed from read_csv to read_excel
 
-    # normalize headers
-    lower_map = {c.lower(): c for c in df.columns}
-    if not all(h in lower_map for h in REQUIRED_HEADERS):
-        raise ValueError(
-            f"Ranges file must contain columns: Parameter, Min, Max (any case). Found: {list(df.columns)}"
-        )
-
-    pcol, mincol, maxcol = (lower_map[h] for h in REQUIRED_HEADERS)
-
-    # drop rows with missing essentials
-    df = df.dropna(subset=[pcol, mincol, maxcol])
+def _ranges_as_arrays(columns, ranges: Dict[str, Tuple[float, float]]):
+    """
+    Return (lo_vec, hi_vec, tracked) numpy arrays aligned with `columns`:
+    per-column min/max (NaN for untracked columns) and a bool mask of which
+    columns have a configured range. Lets callers do one broadcast compare
+    instead of a dict lookup per column.
+    """
+    lo = np.full(len(columns), np.nan)
+    hi = np.full(len(columns), np.nan)
+    tracked = np.zeros(len(columns), dtype=bool)
+    for i, name in enumerate(columns):
+        rng = ranges.get(name)
+        if rng:
+            lo[i], hi[i] = rng
+            tracked[i] = True
+    return lo, hi, tracked
+
+
+# Below this many cells the numpy expression wins; above it the numba
+# kernel avoids the two intermediate bool arrays per compare
+_NUMBA_MIN_CELLS = 1_000_000
+
+if njit is not None:
+
+    @njit(parallel=True, cache=True)
+    def _oor_kernel(vals, lo, hi, out):  # pragma: no cover - compiled
+        for c in prange(vals.shape[1]):
+            lo_c = lo[c]
+            hi_c = hi[c]
+            for r in range(vals.shape[0]):
+                v = vals[r, c]
+                out[r, c] = v < lo_c or v > hi_c
+
+
+def _oor_mask_2d(vals: np.ndarray, lo: np.ndarray, hi: np.ndarray) -> np.ndarray:
+    """
+    Boolean out-of-range mask for a (rows x cols) float array against
+    per-column lo/hi vectors. NaN cells come out False. Dispatches to the
+    fused numba kernel on large arrays when numba is available.
+    """
+    if njit is not None and vals.size >= _NUMBA_MIN_CELLS:
+        out = np.empty(vals.shape, dtype=np.bool_)
+        _oor_kernel(vals, lo, hi, out)
+        return out
+    return (vals < lo) | (vals > hi)
 
-    # coerce to numeric for min/max
-    df[mincol] = pd.to_numeric(df[mincol], errors="coerce")
-    df[maxcol] = pd.to_numeric(df[maxcol], errors="coerce")
-    df = df.dropna(subset=[mincol, maxcol])
 
-    ranges: Dict[str, Tuple[float, float]] = {}
-    for _, row in df.iterrows():
-        param = str(row[pcol]).strip()
-        ranges[param] = (float(row[mincol]), float(row[maxcol]))
-    return ranges
+def highlight_out_of_range(df: pd.DataFrame, ranges: Dict[str, Tuple[float, float]]) -> pd.io.formats.style.Styler:
+    """
+    Returns a Styler with cells outside [min, max] highlighted in red.
+    Only columns present in 'ranges' are evaluated; others are untouched.
+    """
+    def style_frame(frame: pd.DataFrame) -> pd.DataFrame:
+        lo, hi, tracked = _ranges_as_arrays(frame.columns, ranges)
+        css = np.full(frame.shape, _EMPTY, dtype=object)
+        if tracked.any():
+            vals = frame.loc[:, tracked].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float)
+            oor = _oor_mask_2d(vals, lo[tracked], hi[tracked])
+            css[:, tracked] = np.where(oor, _RED, _EMPTY)
+        return pd.DataFrame(css, index=frame.index, columns=frame.columns)
+
+    # axis=None: one call over the whole frame instead of one per column
+    return df.style.apply(style_frame, axis=None)
+
+
+# Maintenance schedules use the same Parameter/Min/Max layout, so the
+# loader is the same function applied to a different file.
+load_maintenance = load_ranges
 
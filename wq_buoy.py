@@ -1,23 +1,101 @@
 # wq_buoy.py
 import io
 from pathlib import Path
+
+import openpyxl
 import pandas as pd
 
 from toolbox import load_ranges, highlight_out_of_range
 
+# Rows per chunk when streaming large uploads through the workbook writer
+DEFAULT_CHUNK_ROWS = 50_000
 
-def _read_dataframe_from_bytes(upload_bytes: bytes, filename: str) -> pd.DataFrame:
+
+def _read_dataframe(filelike, filename: str) -> pd.DataFrame:
     """
-    Reads CSV or Excel into a DataFrame from raw bytes based on filename extension.
-    Defaults to CSV if unrecognized.
+    Reads CSV or Excel into a DataFrame from a file-like object based on
+    filename extension. Defaults to CSV if unrecognized.
+    """
+    suffix = Path(filename).suffix.lower()
+
+    if suffix == ".xlsx":
+        # read_only streams rows instead of building the full openpyxl DOM;
+        # data_only gives cached values for any formula cells
+        wb = openpyxl.load_workbook(filelike, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                return pd.DataFrame()
+            return pd.DataFrame(rows, columns=header)
+        finally:
+            wb.close()
+    if suffix == ".xls":
+        # legacy format, not supported by openpyxl
+        return pd.read_excel(filelike)
+    # default to CSV; pyarrow parses across cores and keeps numeric dtypes
+    # tight (no object fallback on NA)
+    return pd.read_csv(filelike, engine="pyarrow", dtype_backend="pyarrow")
+
+
+def _read_dataframe_from_upload(upload) -> pd.DataFrame:
+    """
+    Reads a FastAPI UploadFile into a DataFrame by parsing directly from its
+    spooled temp file, so the upload is never materialized as a bytes object.
+    """
+    upload.file.seek(0)
+    return _read_dataframe(upload.file, upload.filename or "uploaded.csv")
+
+
+def _iter_dataframe_chunks(filelike, filename: str, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """
+    Yield DataFrame chunks of at most chunk_rows rows from a CSV or Excel
+    file-like object, so no DataFrame larger than one chunk is ever resident.
+    Chunk indexes continue across chunks (0..N-1 over the whole file).
     """
     suffix = Path(filename).suffix.lower()
-    bio = io.BytesIO(upload_bytes)
 
     if suffix in {".xlsx", ".xls"}:
-        return pd.read_excel(bio)
-    # default to CSV
-    return pd.read_csv(bio)
+        # read_only mode streams rows instead of building the full DOM
+        wb = openpyxl.load_workbook(filelike, read_only=True, data_only=True)
+        try:
+            rows = wb.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if header is None:
+                yield pd.DataFrame()
+                return
+            offset = 0
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= chunk_rows:
+                    yield pd.DataFrame(batch, columns=header, index=range(offset, offset + len(batch)))
+                    offset += len(batch)
+                    batch = []
+            if batch or offset == 0:
+                yield pd.DataFrame(batch, columns=header, index=range(offset, offset + len(batch)))
+        finally:
+            wb.close()
+    else:
+        # default to CSV; read_csv keeps the global row numbering per chunk
+        yield from pd.read_csv(filelike, chunksize=chunk_rows)
+
+
+def _iter_dataframe_chunks_from_upload(upload, chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """
+    Chunked variant of _read_dataframe_from_upload, streaming from the
+    UploadFile's spooled temp file.
+    """
+    upload.file.seek(0)
+    yield from _iter_dataframe_chunks(upload.file, upload.filename or "uploaded.csv", chunk_rows)
+
+
+def _read_dataframe_from_bytes(upload_bytes: bytes, filename: str) -> pd.DataFrame:
+    """
+    Reads CSV or Excel into a DataFrame from raw bytes based on filename extension.
+    Defaults to CSV if unrecognized.
+    """
+    return _read_dataframe(io.BytesIO(upload_bytes), filename)
 
 
 def generate_highlighted_excel_from_upload(